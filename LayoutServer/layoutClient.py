@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+
+from layoutServer import SERVER_HOST, SERVER_PORT, decode_packet, encode_message
+
+# LOOPBACK TEST CLIENT
+# Start layoutServer.py first, then run this. It plays the part of a Max patch:
+# subscribes, adds two clusters of fake samples, listens to the frames for a
+# few seconds and asks which sample is nearest the center.
+
+LISTEN_SECONDS = 3.0
+REPLY_TIMEOUT = 2.0     # Give up if the server doesn't answer in time
+RENEW_SECONDS = 5.0     # Resend /subscribe well inside SUBSCRIBE_TIMEOUT
+
+# Which reply answers which request
+REPLY_ADDRESS = {"/add": "/added", "/nearest": "/nearest"}
+
+
+class LayoutClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport = None
+        self.positions = {}       # index -> (x, y), rebuilt from the deltas
+        self.frames = set()
+        self.packets = 0
+        self.bytes = 0
+        self.replies = {reply: asyncio.Queue() for reply in REPLY_ADDRESS.values()}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.packets += 1
+        self.bytes += len(data)
+        for address, args in decode_packet(data):
+            if address == "/frame":
+                self.frames.add(args[0])
+            elif address == "/pos":
+                self.positions[args[0]] = (args[1], args[2])
+            elif address in self.replies:
+                self.replies[address].put_nowait((address, args))
+
+    def error_received(self, exc):
+        # Nobody listening on the server port; the reply timeout reports it
+        pass
+
+    def send(self, address, *args):
+        self.transport.sendto(encode_message(address, *args))
+
+    async def request(self, address, *args):
+        # Throw away late replies to earlier requests so they can't be
+        # mistaken for the answer to this one
+        replies = self.replies[REPLY_ADDRESS[address]]
+        while not replies.empty():
+            replies.get_nowait()
+        self.send(address, *args)
+        return await asyncio.wait_for(replies.get(), REPLY_TIMEOUT)
+
+    async def keep_subscribed(self):
+        while True:
+            self.send("/subscribe")
+            await asyncio.sleep(RENEW_SECONDS)
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(
+        LayoutClient, remote_addr=(SERVER_HOST, SERVER_PORT)
+    )
+
+    renew = asyncio.create_task(client.keep_subscribed())
+
+    try:
+        # --- Add 16 "Kicks" around 2.0 and 16 "Hats" around 5.0 (23 features) ---
+        rng = np.random.default_rng(42)
+        kicks = rng.normal(loc=2.0, scale=0.3, size=(16, 23))
+        hats = rng.normal(loc=5.0, scale=0.3, size=(16, 23))
+        for features in np.concatenate([kicks, hats]):
+            address, args = await client.request("/add", *[float(f) for f in features])
+            print(f"{address} {args[0]}")
+
+        await asyncio.sleep(LISTEN_SECONDS)
+
+        address, args = await client.request("/nearest", 0.0, 0.0)
+        print(f"\nNearest to center: sample {args[0]} (distance {args[1]:.3f})")
+    except asyncio.TimeoutError:
+        print(f"ERROR: No reply from the layout server at {SERVER_HOST}:{SERVER_PORT} "
+              f"within {REPLY_TIMEOUT}s. Is layoutServer.py running?")
+        return
+    finally:
+        renew.cancel()
+        client.send("/unsubscribe")
+        transport.close()
+
+    print(f"Frames seen: {len(client.frames)}")
+    print(f"Points tracked: {len(client.positions)}")
+    print(f"Received {client.packets} packets, {client.bytes} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
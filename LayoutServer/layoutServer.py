@@ -0,0 +1,476 @@
+import asyncio
+import struct
+import time
+
+import numpy as np
+
+# LIVE LAYOUT SERVER
+# One Python process runs the force-directed layout from
+# ChucKForceDirected/forceDirectedSampleBrowser.ck forever and streams the
+# 2D positions to any number of local front-ends (Max, ChucK, Python) as OSC.
+#
+# Messages the server understands (send them to 127.0.0.1:SERVER_PORT):
+#   /subscribe [port]   -> start receiving frames (on "port" if given, handy
+#                          for Max/ChucK where udpsend and udpreceive differ).
+#                          Resend it every few seconds (e.g. from a [metro]):
+#                          subscribers silent for SUBSCRIBE_TIMEOUT are dropped
+#   /unsubscribe        -> stop receiving frames
+#   /refresh            -> resend every position once (after a lost packet)
+#   /add f f f ...      -> add a sample (its feature vector), replies /added i
+#   /nearest x y        -> nearest point in the layout, replies /nearest i dist
+#
+# Messages the server sends to subscribers (as OSC bundles):
+#   /frame frame_number total_points
+#   /pos index x y      -> only for points that moved more than MOVE_THRESHOLD,
+#                          plus every point once per KEYFRAME_SECONDS
+
+# --- PART 1: CONFIGURATION ---
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 9000
+TICK_RATE = 60.0          # Physics steps (and broadcasts) per second
+MOVE_THRESHOLD = 0.005    # Don't resend a point until it moved this far
+MAX_PACKET_BYTES = 1400   # Keep each UDP packet under a typical MTU
+KEYFRAME_SECONDS = 1.0    # Send every point this often, so lost packets heal
+SUBSCRIBE_TIMEOUT = 10.0  # Forget subscribers that stop renewing
+
+K_NEIGHBORS = 3
+
+# PHYSICS TUNING (same values as the ChucK browser)
+REPULSION_FORCE = 0.01    # Weak push
+ATTRACTION_FORCE = 0.05   # Strong pull
+CENTER_GRAVITY = 0.01     # Gentle center pull
+DAMPING = 0.40            # Muddy friction (stops flying)
+MAX_SPEED = 0.1
+MIN_DIST = 0.1            # Stops repulsion exploding when points overlap
+REPULSION_BLOCK = 32      # Rows per repulsion block (memory ~ block * points)
+
+
+# --- PART 2: TINY OSC ENCODER / DECODER ---
+# OSC is just: padded address string, padded type tag string, big-endian args.
+# Writing it by hand keeps the server dependency-free (only numpy).
+def _osc_string(text):
+    data = text.encode("utf-8") + b"\0"
+    return data + b"\0" * (-len(data) % 4)
+
+
+def encode_message(address, *args):
+    """
+    Packs one OSC message. ints -> 'i', floats -> 'f', strings -> 's'.
+    """
+    tags = ","
+    payload = b""
+    for arg in args:
+        if isinstance(arg, (int, np.integer)):
+            tags += "i"
+            payload += struct.pack(">i", int(arg))
+        elif isinstance(arg, (float, np.floating)):
+            tags += "f"
+            payload += struct.pack(">f", float(arg))
+        else:
+            tags += "s"
+            payload += _osc_string(str(arg))
+    return _osc_string(address) + _osc_string(tags) + payload
+
+
+def encode_bundle(messages):
+    """
+    Wraps already-encoded messages in an "immediately" OSC bundle.
+    """
+    data = _osc_string("#bundle") + struct.pack(">Q", 1)
+    for message in messages:
+        data += struct.pack(">i", len(message)) + message
+    return data
+
+
+def _read_string(data, offset):
+    end = data.index(b"\0", offset)
+    text = data[offset:end].decode("utf-8")
+    return text, end + 1 + (-(end + 1) % 4)
+
+
+def decode_packet(data):
+    """
+    Unpacks an OSC message or bundle into a list of (address, args).
+    """
+    if data.startswith(b"#bundle\0"):
+        messages = []
+        offset = 16
+        while offset < len(data):
+            (size,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            messages += decode_packet(data[offset:offset + size])
+            offset += size
+        return messages
+
+    address, offset = _read_string(data, 0)
+    if offset >= len(data):
+        return [(address, [])]
+    tags, offset = _read_string(data, offset)
+
+    args = []
+    for tag in tags[1:]:
+        if tag == "i":
+            args.append(struct.unpack_from(">i", data, offset)[0])
+            offset += 4
+        elif tag == "f":
+            args.append(struct.unpack_from(">f", data, offset)[0])
+            offset += 4
+        elif tag == "s":
+            text, offset = _read_string(data, offset)
+            args.append(text)
+        else:
+            raise ValueError(f"Unsupported OSC type tag: {tag!r}")
+    return [(address, args)]
+
+
+# --- PART 3: THE LAYOUT ENGINE ---
+def simulate(positions, velocities, edge_i, edge_j):
+    """
+    One physics frame on plain arrays. Returns the new positions and velocities.
+    """
+    n = len(positions)
+    pos = positions
+
+    # 1. Gravity
+    force = -pos * CENTER_GRAVITY
+
+    # 2. Repulsion (every pair, REPULSION_BLOCK rows at a time to bound memory)
+    for start in range(0, n, REPULSION_BLOCK):
+        stop = min(start + REPULSION_BLOCK, n)
+        dx = pos[start:stop, 0, None] - pos[None, :, 0]
+        dy = pos[start:stop, 1, None] - pos[None, :, 1]
+        # strength = force / dist = REPULSION_FORCE / dist^3, worked out in place
+        strength = dx * dx
+        strength += dy * dy
+        np.maximum(strength, MIN_DIST * MIN_DIST, out=strength)
+        strength *= np.sqrt(strength)
+        np.divide(REPULSION_FORCE, strength, out=strength)
+        strength[np.arange(stop - start), np.arange(start, stop)] = 0.0
+        force[start:stop, 0] += np.einsum("ij,ij->i", dx, strength)
+        force[start:stop, 1] += np.einsum("ij,ij->i", dy, strength)
+
+    # 3. Attraction (along each KNN link, equal and opposite)
+    pull = ATTRACTION_FORCE * (pos[edge_j] - pos[edge_i])
+    for axis in range(2):
+        force[:, axis] += np.bincount(edge_i, weights=pull[:, axis], minlength=n)
+        force[:, axis] -= np.bincount(edge_j, weights=pull[:, axis], minlength=n)
+
+    # B. UPDATE (WITH CLAMPING)
+    velocities = np.clip((velocities + force) * DAMPING, -MAX_SPEED, MAX_SPEED)
+    return pos + velocities, velocities
+
+
+class LayoutEngine:
+    """
+    The ChucK force-directed physics, vectorised with numpy so one step moves
+    every point at once instead of looping point by point.
+    """
+
+    def __init__(self, seed=42):
+        self.rng = np.random.default_rng(seed)
+        self.features = None
+        self.sq_norms = np.zeros(0)
+        self.positions = np.zeros((0, 2))
+        self.velocities = np.zeros((0, 2))
+        self.neighbors = np.zeros((0, 0), dtype=int)      # Each row's KNN
+        self.neighbor_dist = np.zeros((0, 0))             # ...and their dist^2
+        self.edges = {}              # (low, high) -> how many rows list the link
+        self.edge_i = np.zeros(0, dtype=int)              # Symmetric KNN graph
+        self.edge_j = np.zeros(0, dtype=int)              # as two index arrays
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add_sample(self, feature_vector):
+        """
+        Drops a new point at a random spot and adds it to the KNN graph.
+        Returns the index of the new point.
+        """
+        vector = np.asarray(feature_vector, dtype=float)
+        if vector.ndim != 1 or vector.size == 0:
+            raise ValueError("A sample needs at least one feature")
+        if not np.all(np.isfinite(vector)):
+            raise ValueError("Features must be finite numbers")
+        if self.features is None:
+            self.features = vector[None, :]
+        elif vector.size != self.features.shape[1]:
+            raise ValueError(
+                f"Expected {self.features.shape[1]} features, got {vector.size}"
+            )
+        else:
+            self.features = np.vstack([self.features, vector])
+
+        self.sq_norms = np.append(self.sq_norms, vector @ vector)
+        self.positions = np.vstack([self.positions, self.rng.uniform(-1, 1, (1, 2))])
+        self.velocities = np.vstack([self.velocities, np.zeros((1, 2))])
+        if len(self) <= K_NEIGHBORS + 1:
+            self._build_graph()
+        else:
+            self._insert_into_graph()
+        self.edge_i, self.edge_j = np.array(list(self.edges), dtype=int).reshape(-1, 2).T
+        return len(self) - 1
+
+    def _distances_to(self, vector_idx):
+        # |a|^2 + |b|^2 - 2 a.b, one row at a time (no N x N x D array)
+        row = self.sq_norms + self.sq_norms[vector_idx] - 2.0 * (self.features @ self.features[vector_idx])
+        row = np.maximum(row, 0.0)
+        row[vector_idx] = np.inf
+        return row
+
+    def _link(self, a, b):
+        # Symmetric graph (A linked to B means B linked to A) so every pull
+        # has an equal and opposite pull and the layout can come to rest.
+        # The count remembers whether one or both rows list the link.
+        key = (min(a, b), max(a, b))
+        self.edges[key] = self.edges.get(key, 0) + 1
+
+    def _unlink(self, a, b):
+        key = (min(a, b), max(a, b))
+        self.edges[key] -= 1
+        if self.edges[key] == 0:
+            del self.edges[key]
+
+    def _build_graph(self):
+        # Brute-force KNN in feature space (only used while the set is tiny)
+        n = len(self)
+        k = min(K_NEIGHBORS, n - 1)
+        dist_sq = np.array([self._distances_to(i) for i in range(n)])
+        self.neighbors = np.argsort(dist_sq, axis=1)[:, :k]
+        self.neighbor_dist = np.take_along_axis(dist_sq, self.neighbors, axis=1)
+        self.edges = {}
+        for i in range(n):
+            for j in self.neighbors[i]:
+                self._link(i, int(j))
+
+    def _insert_into_graph(self):
+        # Only the new point's distance row is computed. Older points swap
+        # their farthest neighbor for the new one if it is closer, and only
+        # those links change in the edge list.
+        new = len(self) - 1
+        row = self._distances_to(new)
+
+        closer = np.flatnonzero(row[:new] < self.neighbor_dist.max(axis=1))
+        slots = np.argmax(self.neighbor_dist[closer], axis=1)
+        for i, old in zip(closer, self.neighbors[closer, slots]):
+            self._unlink(int(i), int(old))
+            self._link(int(i), new)
+        self.neighbors[closer, slots] = new
+        self.neighbor_dist[closer, slots] = row[closer]
+
+        own = np.argsort(row)[:K_NEIGHBORS]
+        for j in own:
+            self._link(new, int(j))
+        self.neighbors = np.vstack([self.neighbors, own])
+        self.neighbor_dist = np.vstack([self.neighbor_dist, row[own]])
+
+    def snapshot(self):
+        """
+        The arrays simulate() needs. add_sample() replaces these arrays
+        rather than editing them, so a step can run on them in another thread.
+        """
+        return self.positions, self.velocities, self.edge_i, self.edge_j
+
+    def apply(self, positions, velocities):
+        # Points added while the step ran keep their own starting values
+        n = len(positions)
+        self.positions[:n] = positions
+        self.velocities[:n] = velocities
+
+    def step(self):
+        """
+        Runs one physics frame: gravity, repulsion, attraction, then update.
+        """
+        self.apply(*simulate(*self.snapshot()))
+
+    def nearest(self, x, y):
+        """
+        Index of the point closest to (x, y) in the layout, and its distance.
+        """
+        if len(self) == 0:
+            return -1, float("inf")
+        dist = np.hypot(self.positions[:, 0] - x, self.positions[:, 1] - y)
+        idx = int(np.argmin(dist))
+        return idx, float(dist[idx])
+
+
+# --- PART 4: THE UDP SERVER ---
+class LayoutServer(asyncio.DatagramProtocol):
+    """
+    Receives control messages and broadcasts delta-encoded frames.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.transport = None
+        self.subscribers = {}      # Address that gets frames -> last time heard from
+        self.reply_to = {}         # Sender address -> address it listens on
+        self.last_sent = np.zeros((0, 2))
+        self.frame = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            messages = decode_packet(data)
+        except (ValueError, IndexError, struct.error) as error:
+            print(f"Bad packet from {addr}: {error}")
+            return
+        for address, args in messages:
+            self.handle_message(address, args, addr)
+
+    def error_received(self, exc):
+        # A client went away (ICMP port unreachable); it expires on its own
+        pass
+
+    def handle_message(self, address, args, addr):
+        reply_addr = self.reply_to.get(addr, addr)
+        if reply_addr in self.subscribers:
+            self.subscribers[reply_addr] = time.monotonic()
+
+        if address == "/subscribe":
+            if args:
+                try:
+                    port = int(args[0])
+                    if not 1 <= port <= 65535:
+                        raise ValueError(f"port {port} out of range")
+                except (ValueError, OverflowError) as error:
+                    print(f"Rejected /subscribe from {addr}: {error}")
+                    return
+                reply_addr = (addr[0], port)
+                self.reply_to[addr] = reply_addr
+            is_new = reply_addr not in self.subscribers
+            self.subscribers[reply_addr] = time.monotonic()
+            if is_new:
+                # Newcomers need everything once, not just what moved
+                self.send(self.encode_frame(np.arange(len(self.engine))), reply_addr)
+                print(f"Subscribed: {reply_addr}")
+
+        elif address == "/unsubscribe":
+            self.drop_subscriber(reply_addr)
+            print(f"Unsubscribed: {reply_addr}")
+
+        elif address == "/refresh":
+            self.send(self.encode_frame(np.arange(len(self.engine))), reply_addr)
+
+        elif address == "/add":
+            try:
+                idx = self.engine.add_sample([float(a) for a in args])
+            except ValueError as error:
+                print(f"Rejected /add from {addr}: {error}")
+                return
+            self.last_sent = np.vstack([self.last_sent, [[np.nan, np.nan]]])
+            self.send([encode_message("/added", idx)], reply_addr)
+
+        elif address == "/nearest":
+            try:
+                if len(args) < 2:
+                    raise ValueError("expected x y")
+                x, y = float(args[0]), float(args[1])
+            except ValueError as error:
+                print(f"Rejected /nearest from {addr}: {error}")
+                return
+            idx, dist = self.engine.nearest(x, y)
+            self.send([encode_message("/nearest", idx, dist)], reply_addr)
+
+        else:
+            print(f"Unknown message {address} {args}")
+
+    def drop_subscriber(self, addr):
+        self.subscribers.pop(addr, None)
+        for sender in [s for s, target in self.reply_to.items() if target == addr]:
+            del self.reply_to[sender]
+
+    def expire_subscribers(self):
+        """
+        Forgets subscribers that haven't renewed within SUBSCRIBE_TIMEOUT
+        (e.g. a patch that was closed without sending /unsubscribe).
+        """
+        cutoff = time.monotonic() - SUBSCRIBE_TIMEOUT
+        for addr in [a for a, seen in self.subscribers.items() if seen < cutoff]:
+            self.drop_subscriber(addr)
+            print(f"Subscription expired: {addr}")
+
+    def encode_frame(self, indices):
+        """
+        Builds the /frame header plus one /pos message per index.
+        """
+        messages = [encode_message("/frame", self.frame, len(self.engine))]
+        for i in indices:
+            x, y = self.engine.positions[i]
+            messages.append(encode_message("/pos", int(i), float(x), float(y)))
+        return messages
+
+    def send(self, messages, addr):
+        # Split into bundles that each fit in one UDP packet.
+        # The /frame header leads every chunk so clients can count frames.
+        header, body = messages[0], messages[1:]
+        chunk, size = [header], 16 + 4 + len(header)
+        for message in body:
+            if size + 4 + len(message) > MAX_PACKET_BYTES:
+                self.transport.sendto(encode_bundle(chunk), addr)
+                chunk, size = [header], 16 + 4 + len(header)
+            chunk.append(message)
+            size += 4 + len(message)
+        self.transport.sendto(encode_bundle(chunk), addr)
+
+    def broadcast(self, keyframe=False):
+        """
+        Sends only the points that moved more than MOVE_THRESHOLD since the
+        last time they were sent (points never sent have NaN and always go).
+        A keyframe sends every point, so a client that lost a packet catches up.
+        """
+        self.expire_subscribers()
+        if keyframe:
+            changed = np.arange(len(self.engine))
+        else:
+            moved = np.hypot(*(self.engine.positions - self.last_sent).T)
+            changed = np.flatnonzero(~(moved <= MOVE_THRESHOLD))
+        if len(changed) == 0:
+            return
+        self.last_sent[changed] = self.engine.positions[changed]
+        if not self.subscribers:
+            return
+        messages = self.encode_frame(changed)
+        for addr in self.subscribers:
+            self.send(messages, addr)
+
+
+async def run_physics(server):
+    tick = 1.0 / TICK_RATE
+    keyframe_every = max(1, round(KEYFRAME_SECONDS * TICK_RATE))
+    loop = asyncio.get_running_loop()
+    next_tick = loop.time()
+    while True:
+        # The step runs in a worker thread so /add, /nearest and /subscribe
+        # are still answered while a big layout is being computed
+        engine = server.engine
+        engine.apply(*await loop.run_in_executor(None, simulate, *engine.snapshot()))
+        server.frame += 1
+        server.broadcast(keyframe=server.frame % keyframe_every == 0)
+        next_tick += tick
+        # If a step ran long, start counting again from now instead of
+        # running a burst of back-to-back steps to catch up
+        if next_tick < loop.time():
+            next_tick = loop.time()
+        await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: LayoutServer(LayoutEngine()),
+        local_addr=(SERVER_HOST, SERVER_PORT),
+    )
+    print(f"Layout server listening on {SERVER_HOST}:{SERVER_PORT}")
+    try:
+        await run_physics(server)
+    finally:
+        transport.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nLayout server stopped")